@@ -3,35 +3,140 @@ deployment/app.py
 -----------------
 FastAPI application exposing a REST endpoint for real-time anomaly detection.
 
-Endpoint:
+Endpoints:
     POST /predict
-Example request:
-    {
-        "temperature": -22.5
-    }
+        Example request:
+            {
+                "temperature": -22.5,
+                "room": "Frozen_Storage_A"      # optional
+            }
+    POST /predict/batch
+        Scores many readings in one model call. Accepts columnar JSON,
+        Arrow IPC or the raw little-endian layout documented in
+        deployment/payloads.py, selected by Content-Type. The response
+        format follows the Accept header (defaults to the request format).
+    GET /stats/cascade
+        Counters showing how many readings skipped the model.
+
+Both predict endpoints take an optional `use_model` query parameter:
+true forces the LSTM, false bypasses it; omitted lets the cascade decide.
+
+Detector state is restored on startup (snapshot or database replay) and
+checkpointed on graceful shutdown.
 """
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from .inference import detect_anomaly
+from starlette.concurrency import run_in_threadpool
+from . import payloads
+from .inference import (
+    detect_anomaly, detect_anomaly_batch, get_cascade_stats, restore_state, checkpoint,
+)
+
+if payloads.orjson is not None:
+    class FastJSONResponse(Response):
+        """JSON response rendered with orjson through payloads.json_dumps."""
+        media_type = payloads.JSON_MEDIA_TYPE
+
+        def render(self, content):
+            return payloads.json_dumps(content)
+else:
+    FastJSONResponse = JSONResponse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm-starts the detector state and checkpoints it on shutdown."""
+    restore = restore_state()
+    print(f"♻️ Detector state restored from {restore['source']} "
+          f"({restore['replayed']} readings replayed) in {restore['elapsed_ms']:.1f} ms")
+    yield
+    checkpoint()
 
 
 # Initialize the FastAPI application
-app = FastAPI(title="Cold Storage Anomaly Detection API", version="1.0.0")
+app = FastAPI(
+    title="Cold Storage Anomaly Detection API",
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+)
 
 
 class Reading(BaseModel):
     """Defines the input schema for temperature readings."""
     temperature: float
+    room: Optional[str] = None  # readings without a room share the default room's state
 
 
 @app.post("/predict")
-def predict(reading: Reading):
+def predict(reading: Reading, use_model: Optional[bool] = None):
     """
     Perform anomaly detection on a single temperature reading.
 
     Returns:
         JSON response with hybrid detection details.
     """
-    result = detect_anomaly(reading.temperature)
+    result = detect_anomaly(reading.temperature, reading.room, use_model)
     return result
+
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request, use_model: Optional[bool] = None):
+    """
+    Perform anomaly detection on a batch of readings.
+
+    Returns:
+        Column-oriented detection results encoded in the negotiated format.
+    """
+    content_type = payloads.media_type(request.headers.get("content-type"))
+    decoder = payloads.DECODERS.get(content_type)
+    if decoder is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+
+    accept = payloads.accept_media_type(request.headers.get("accept"), default=content_type)
+    if accept is None:
+        raise HTTPException(status_code=406,
+                            detail=f"Unsupported response type: {request.headers.get('accept')}")
+    encoder = payloads.ENCODERS[accept]
+
+    body = await request.body()
+    # Decoding, the model call and encoding are CPU-bound; keep them off the event loop
+    return await run_in_threadpool(_score_batch, body, decoder, encoder, accept, use_model)
+
+
+def _score_batch(body, decoder, encoder, accept, use_model):
+    """Decodes, scores and encodes a batch request (runs in a worker thread)."""
+    try:
+        batch = decoder(body)
+    except payloads.PayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rooms = batch.rooms()
+    results = detect_anomaly_batch(batch.temperature, rooms, use_model)
+    if accept != payloads.RAW_MEDIA_TYPE:
+        if rooms is not None:
+            results["room"] = rooms
+        if batch.timestamp is not None:
+            results["timestamp"] = batch.timestamp
+
+    try:
+        content = encoder(results)
+    except payloads.PayloadError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    return Response(content=content, media_type=accept)
+
+
+@app.get("/stats/cascade")
+def cascade_stats():
+    """
+    Report how many readings were short-circuited by the cheap checks.
+
+    Returns:
+        JSON with reading/escalation counters and the short-circuit rate.
+    """
+    return get_cascade_stats()
@@ -0,0 +1,129 @@
+"""
+benchmark_payloads.py
+---------------------
+Compares payload size and decode/encode time of the batch formats in
+deployment/payloads.py against the current per-object JSON format
+(a list of {"temperature": ...} objects validated one by one with Pydantic).
+
+No model is loaded: only serialization costs are measured.
+
+Run:
+    python deployment/benchmark_payloads.py --rows 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from deployment import payloads  # noqa: E402
+
+ROOMS = [
+    "Frozen_Storage_A", "Frozen_Storage_B", "Chilled_Storage_A", "Chilled_Storage_B",
+    "Dispatch_Bay", "Receiving_Zone", "Packaging_Section", "Maintenance_Room",
+]
+
+
+class Reading(BaseModel):
+    """Mirrors deployment.app.Reading (not imported to avoid loading the model)."""
+    temperature: float
+
+
+def best_of(fn, repeat):
+    """Best wall-clock time of `repeat` calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def make_readings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    temperature = rng.normal(-21.5, 1.5, n).astype(np.float32)
+    rooms = np.asarray(ROOMS)[rng.integers(0, len(ROOMS), n)]
+    timestamp = 1759276800 + np.arange(n, dtype=np.int64) * 900
+    return temperature, rooms, timestamp
+
+
+def make_results(n, seed=1):
+    rng = np.random.default_rng(seed)
+    flags = rng.random((4, n)) < 0.05
+    escalated = rng.random(n) < 0.2
+    return {
+        "reconstruction_error": np.where(escalated, rng.random(n), np.nan).astype(np.float32),
+        "raw_anomaly": flags[0],
+        "persistence_alert": flags[1],
+        "bounds_breach": flags[2],
+        "hybrid_alert": flags[1] | flags[2],
+        "escalated": escalated,
+    }
+
+
+def run(n, repeat):
+    temperature, rooms, timestamp = make_readings(n)
+    results = make_results(n)
+
+    cases = {}
+
+    # Current format: one JSON object per reading, validated per object
+    per_object = json.dumps([{"temperature": float(t)} for t in temperature]).encode()
+    cases["json per-object (current)"] = (
+        per_object,
+        lambda: np.fromiter(
+            (Reading(**r).temperature for r in json.loads(per_object)), dtype=np.float32
+        ),
+        lambda: json.dumps([
+            {k: (v[i].item()) for k, v in results.items()} for i in range(n)
+        ]).encode(),
+    )
+
+    columnar = payloads.json_dumps({
+        "temperature": temperature, "room": rooms.tolist(), "timestamp": timestamp,
+    })
+    cases["json columnar"] = (
+        columnar,
+        lambda: payloads.decode_json(columnar),
+        lambda: payloads.encode_json(results),
+    )
+
+    raw = payloads.encode_raw_request(temperature, rooms, timestamp)
+    cases["raw float32"] = (
+        raw,
+        lambda: payloads.decode_raw(raw),
+        lambda: payloads.encode_raw(results),
+    )
+
+    if payloads.pa is not None:
+        arrow = payloads.encode_arrow_request(temperature, rooms, timestamp)
+        cases["arrow ipc"] = (
+            arrow,
+            lambda: payloads.decode_arrow(arrow),
+            lambda: payloads.encode_arrow(results),
+        )
+    else:
+        print("⚠️ pyarrow not installed — skipping Arrow IPC.")
+
+    print(f"\n📦 Batch payload benchmark — {n:,} readings (best of {repeat})\n")
+    print(f"{'format':<28}{'request KB':>12}{'decode ms':>12}{'response KB':>13}{'encode ms':>12}")
+    for name, (body, decode, encode) in cases.items():
+        response = encode()
+        print(
+            f"{name:<28}{len(body) / 1024:>12.1f}{best_of(decode, repeat):>12.2f}"
+            f"{len(response) / 1024:>13.1f}{best_of(encode, repeat):>12.2f}"
+        )
+    print(f"\n(JSON serializer: {'orjson' if payloads.orjson is not None else 'json'})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch payload formats.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -4,19 +4,97 @@ deployment/config.py
 Holds configuration constants used across the deployment phase.
 """
 
+import json
 import os
+import sqlite3
 
 # === PATH CONFIGURATION ===
 # Locate model and scaler relative to this file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "..", "models", "lstm_model.keras")
-SCALER_PATH = os.path.join(BASE_DIR, "..", "models", "scaler.pkl")
+MODELS_DIR = os.path.join(BASE_DIR, "..", "models")
+MODEL_PATH = os.path.join(MODELS_DIR, "lstm_model.keras")
+SCALER_PATH = os.path.join(MODELS_DIR, "scaler.pkl")
+
+# Operational database created by scripts/database_setup.py
+DB_PATH = os.path.join(BASE_DIR, "..", "database", "cold_storage.db")
+
+# Calibrated reconstruction-error thresholds written by scripts/model_training.py
+# Keys are room names (per-room models) or "shared" (single model for all rooms)
+THRESHOLDS_PATH = os.path.join(MODELS_DIR, "thresholds.json")
+
+
+def room_model_paths(room_name):
+    """Returns (model_path, scaler_path) for a room-specific model."""
+    room_dir = os.path.join(MODELS_DIR, room_name)
+    return (
+        os.path.join(room_dir, "lstm_model.keras"),
+        os.path.join(room_dir, "scaler.pkl"),
+    )
+
+
+# === MODEL CONFIG ===
+# Each sequence = last 20 readings (~5 hours at 15-min intervals)
+SEQ_LEN = 20
 
 # === OPERATIONAL BOUNDS ===
-# Example for frozen storage room (temperatures in °C)
+# Example for frozen storage room (temperatures in °C); used for readings
+# without a room and for rooms missing from the rooms table
 MIN_TEMP = -25.0
 MAX_TEMP = -18.0
 
+
+def load_room_bounds(db_path):
+    """Returns {room_name: (min_temp, max_temp)} from the rooms table, or {} if unavailable."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT room_name, min_temp, max_temp FROM rooms").fetchall()
+    except sqlite3.Error:  # database not set up yet
+        return {}
+    finally:
+        conn.close()
+    return {
+        room: (MIN_TEMP if lo is None else lo, MAX_TEMP if hi is None else hi)
+        for room, lo, hi in rows
+    }
+
+
+# Per-room safe temperature ranges (chilled, ambient, ...) from the database
+ROOM_BOUNDS = load_room_bounds(DB_PATH)
+
 # === ANOMALY LOGIC CONFIG ===
 # Persistence rule: an alert is only raised if an anomaly persists N consecutive times
 PERSISTENCE_N = 2
+
+# Fallback reconstruction-error threshold when no calibrated value is available
+DEFAULT_THRESHOLD = 0.2
+
+ANOMALY_THRESHOLDS = {}
+if os.path.exists(THRESHOLDS_PATH):
+    with open(THRESHOLDS_PATH) as f:
+        ANOMALY_THRESHOLDS = json.load(f)
+
+# === DETECTION CASCADE ===
+# Cheap vectorized checks run first; only ambiguous readings are escalated to the LSTM.
+# A reading skips the model when it is inside the bounds (with margin), close to
+# the previous reading and close to the room's rolling mean.
+CASCADE_ENABLED = True
+CASCADE_WINDOW = 20           # readings kept per room for rolling mean/std
+CASCADE_MIN_HISTORY = 5       # rolling stats need this many readings before skipping
+CASCADE_BOUNDS_MARGIN = 0.5   # °C inside MIN_TEMP / MAX_TEMP
+CASCADE_MAX_DELTA = 1.5       # °C change from the previous reading
+CASCADE_MAX_Z = 2.0           # |z-score| against the rolling stats
+
+# === STATE SNAPSHOTS ===
+# Detector state is checkpointed periodically and on shutdown, and restored on startup.
+# Stale or missing snapshots fall back to replaying recent readings from the database.
+SNAPSHOT_PATH = os.path.join(BASE_DIR, "state", "detector_state.snap")
+SNAPSHOT_EVERY = 100          # readings between periodic checkpoints
+SNAPSHOT_MAX_AGE = 6 * 3600   # seconds before a snapshot is considered stale
+# Replay reads sensor_readings (which carries room_name) so per-room state is rebuilt,
+# plus the room-less readings logged by simulate_stream.py for the default room
+REPLAY_DB_PATH = DB_PATH
+STREAM_DB_PATH = os.path.join(BASE_DIR, "temperature_data.db")
+REPLAY_LIMIT = 50             # most recent readings replayed per room when no snapshot is usable
+REPLAY_MAX_AGE = SNAPSHOT_MAX_AGE  # seconds; older readings are never replayed
@@ -0,0 +1,56 @@
+"""
+evaluate_cascade.py
+-------------------
+Offline evaluation of the cheap-first detection cascade.
+
+Replays historical readings through the detector twice — once with the
+cascade and once always running the model — and reports how often the model
+was skipped and how the alert decisions differ.
+
+Run:
+    python deployment/evaluate_cascade.py --room Frozen_Storage_A
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from deployment.inference import evaluate_cascade  # noqa: E402
+
+# === Default data source ===
+CSV_PATH = "data/simulated_sensor_data.csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cascade vs always-model decisions.")
+    parser.add_argument("--data", default=CSV_PATH)
+    parser.add_argument("--room", nargs="+", default=["Frozen_Storage_A"],
+                        help="Rooms to replay (bounds come from the rooms table).")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data, usecols=["timestamp", "room_name", "temperature"])
+    df = df[df["room_name"].isin(args.room)]
+    df = df.sort_values(["timestamp", "room_name"])
+    if df.empty:
+        print("⚠️ No readings found for the selected rooms.")
+        return
+
+    summary = evaluate_cascade(df["temperature"].to_numpy(), df["room_name"].to_numpy())
+
+    print(f"\n🧪 Cascade evaluation — {summary['readings']:,} readings ({', '.join(args.room)})\n")
+    print(f"Short-circuited:           {summary['short_circuited']:,} "
+          f"({summary['short_circuit_rate']:.1%})")
+    print(f"Escalated to model:        {summary['escalated']:,}")
+    print(f"Warming up (no window):    {summary['warming_up']:,}")
+    print(f"Alerts (cascade / model):  {summary['alerts_cascade']:,} / {summary['alerts_full_model']:,}")
+    print(f"Alert agreement:           {summary['alert_agreement']:.2%}")
+    print(f"Missed alerts:             {summary['missed_alerts']:,}")
+    print(f"Extra alerts:              {summary['extra_alerts']:,}")
+    print(f"Raw anomaly disagreements: {summary['raw_anomaly_disagreements']:,}")
+
+
+if __name__ == "__main__":
+    main()
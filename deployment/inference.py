@@ -2,79 +2,403 @@
 deployment/inference.py
 -----------------------
 Contains the anomaly detection logic and integrates:
-1. Model inference (LSTM reconstruction)
-2. Statistical error-based detection
-3. Persistence rule (consecutive anomalies)
-4. Operational bound check
-5. Hybrid decision rule
+1. Cheap-first cascade (bounds, delta, rolling z-score) that decides
+   which readings need the model
+2. Model inference (LSTM reconstruction)
+3. Statistical error-based detection
+4. Persistence rule (consecutive anomalies)
+5. Operational bound check (per-room range from the rooms table)
+6. Hybrid decision rule
+7. Checkpoint/restore of the streaming state across restarts
 """
 
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
 import numpy as np
 import joblib
+from numpy.lib.stride_tricks import sliding_window_view
 import tensorflow as tf
-from deployment.config import MODEL_PATH, SCALER_PATH, MIN_TEMP, MAX_TEMP, PERSISTENCE_N
+from deployment.config import (
+    MODEL_PATH, SCALER_PATH, THRESHOLDS_PATH, room_model_paths,
+    SEQ_LEN, MIN_TEMP, MAX_TEMP, ROOM_BOUNDS, PERSISTENCE_N,
+    ANOMALY_THRESHOLDS, DEFAULT_THRESHOLD,
+    CASCADE_ENABLED, CASCADE_WINDOW, CASCADE_MIN_HISTORY, CASCADE_BOUNDS_MARGIN,
+    CASCADE_MAX_DELTA, CASCADE_MAX_Z,
+    SNAPSHOT_PATH, SNAPSHOT_EVERY, SNAPSHOT_MAX_AGE,
+    REPLAY_DB_PATH, STREAM_DB_PATH, REPLAY_LIMIT, REPLAY_MAX_AGE,
+)
+from deployment.state import (
+    DetectorState, artifacts_digest, save_snapshot, load_snapshot,
+    load_history, load_stream_history,
+)
 
 # === MODEL AND SCALER LOADING ===
-# These are loaded once when the API starts
+# The shared model/scaler are loaded once when the API starts. Rooms with a
+# calibrated per-room model (scripts/model_training.py --mode per-room) get
+# their own model, scaler and threshold, loaded on first use.
 model = tf.keras.models.load_model(MODEL_PATH)
 scaler = joblib.load(SCALER_PATH)
 
-# Track recent anomalies for persistence rule
-recent_anomalies = []
+# Statistical threshold for the shared model (calibrated by scripts/model_training.py)
+THRESHOLD = ANOMALY_THRESHOLDS.get("shared", DEFAULT_THRESHOLD)
+
+# Only rooms listed in thresholds.json are looked up on disk, so client-supplied
+# room names never turn into arbitrary file paths
+ROOM_MODELS = sorted(
+    room for room in ANOMALY_THRESHOLDS
+    if room != "shared" and all(os.path.exists(p) for p in room_model_paths(room))
+)
+_room_artifacts = {}
+
+
+def _artifact_paths():
+    """Every model artifact in use, for versioning snapshots."""
+    paths = [MODEL_PATH, SCALER_PATH]
+    for room in ROOM_MODELS:
+        paths.extend(room_model_paths(room))
+    if os.path.exists(THRESHOLDS_PATH):
+        paths.append(THRESHOLDS_PATH)
+    return paths
+
+
+# Snapshots are only restored for the exact models/scalers they were taken with
+MODEL_DIGEST = artifacts_digest(*_artifact_paths())
+
+# Readings without a room share this persistence history
+DEFAULT_ROOM = "default"
+
+# Live detector state; replaced by restore_state() on API startup
+state = DetectorState()
+_state_lock = threading.RLock()  # held for a whole _detect call; re-entered by checkpoint()
+_last_checkpoint = 0  # state.stats["readings"] at the last checkpoint
+
+
+def _update_persistence(st, room, is_anom_raw):
+    """Appends a raw anomaly flag to the room's history and applies the persistence rule."""
+    history = st.recent_anomalies[room]
+    history.append(bool(is_anom_raw))
+    if len(history) > PERSISTENCE_N:
+        history.pop(0)
+    return all(history[-PERSISTENCE_N:])
 
 
-def detect_anomaly(data_point: float):
+def _artifacts_for(room):
+    """Returns (model, scaler, threshold) for a room, falling back to the shared model."""
+    if room not in ROOM_MODELS:
+        return model, scaler, THRESHOLD
+    if room not in _room_artifacts:
+        model_path, scaler_path = room_model_paths(room)
+        _room_artifacts[room] = (
+            tf.keras.models.load_model(model_path),
+            joblib.load(scaler_path),
+            ANOMALY_THRESHOLDS[room],
+        )
+    return _room_artifacts[room]
+
+
+def _reconstruction_errors(windows, room):
+    """
+    Scales [m, SEQ_LEN] temperature windows and returns the mean absolute LSTM
+    reconstruction error of each (the quantity the training threshold is
+    calibrated on), together with the threshold of the model that scored them.
+    """
+    room_model, room_scaler, threshold = _artifacts_for(room)
+    scaled = room_scaler.transform(windows.reshape(-1, 1)).reshape(windows.shape)
+    recon = room_model.predict(scaled[..., np.newaxis], verbose=0)
+    return np.mean(np.abs(recon - scaled), axis=1), threshold
+
+
+def _room_bounds(rooms):
+    """Per-row (min_temp, max_temp) arrays; rooms without bounds use MIN_TEMP/MAX_TEMP."""
+    min_temp = np.full(len(rooms), MIN_TEMP)
+    max_temp = np.full(len(rooms), MAX_TEMP)
+    for room in np.unique(rooms):
+        if room in ROOM_BOUNDS:
+            mask = rooms == room
+            min_temp[mask], max_temp[mask] = ROOM_BOUNDS[room]
+    return min_temp, max_temp
+
+
+def _score_windows(st, temperatures, rooms, escalate):
+    """
+    Runs the model on the SEQ_LEN window ending at each escalated reading.
+
+    Windows are drawn from the room's history followed by earlier rows of the
+    same batch. Readings without SEQ_LEN - 1 prior readings cannot be scored
+    yet and keep a NaN error.
+
+    Returns:
+        (errors, thresholds): float arrays, NaN where the model did not run.
+    """
+    n = len(temperatures)
+    errors = np.full(n, np.nan, dtype=np.float32)
+    thresholds = np.full(n, np.nan)
+
+    for room in np.unique(rooms[escalate]):
+        idx = np.flatnonzero(rooms == room)
+        history = np.fromiter(st.recent_temps[room], dtype=np.float64)
+        history = history[max(len(history) - (SEQ_LEN - 1), 0):]
+        series = np.concatenate([history, temperatures[idx]])
+        if len(series) < SEQ_LEN:
+            continue
+
+        # Window k covers series[k:k + SEQ_LEN]; row j ends at series[len(history) + j]
+        win_idx = len(history) + np.arange(len(idx)) - (SEQ_LEN - 1)
+        sel = escalate[idx] & (win_idx >= 0)
+        if not sel.any():
+            continue
+        windows = sliding_window_view(series, SEQ_LEN)[win_idx[sel]]
+        errors[idx[sel]], thresholds[idx[sel]] = _reconstruction_errors(windows, room)
+    return errors, thresholds
+
+
+def _cheap_checks(st, temperatures, rooms, min_temp, max_temp):
+    """
+    Vectorized first tier of the cascade.
+
+    `min_temp`/`max_temp` are the per-row operational bounds (see _room_bounds).
+
+    Returns:
+        (clearly_normal, suspicious): boolean arrays. `clearly_normal` readings
+        can skip the model; `suspicious` marks a large jump or |z| against the
+        room's rolling stats (computed from readings before each row, including
+        earlier rows of the same batch).
+    """
+    n = len(temperatures)
+    has_history = np.zeros(n, dtype=bool)
+    delta = np.zeros(n)
+    z = np.zeros(n)
+
+    for room in np.unique(rooms):
+        idx = np.flatnonzero(rooms == room)
+        history = np.fromiter(st.recent_temps[room], dtype=np.float64)
+        series = np.concatenate([history, temperatures[idx]])
+        pos = np.arange(len(history), len(series))
+
+        # Rolling mean/std over the CASCADE_WINDOW readings before each position
+        cs = np.concatenate([[0.0], np.cumsum(series)])
+        cs2 = np.concatenate([[0.0], np.cumsum(series ** 2)])
+        start = np.maximum(pos - CASCADE_WINDOW, 0)
+        count = pos - start
+        safe = np.maximum(count, 1)
+        mean = (cs[pos] - cs[start]) / safe
+        std = np.sqrt(np.maximum((cs2[pos] - cs2[start]) / safe - mean ** 2, 0.0))
+
+        has_history[idx] = count >= max(CASCADE_MIN_HISTORY, 1)
+        delta[idx] = np.where(pos > 0, series[pos] - series[np.maximum(pos - 1, 0)], 0.0)
+        z[idx] = (series[pos] - mean) / np.maximum(std, 1e-6)
+
+    calm = (np.abs(delta) <= CASCADE_MAX_DELTA) & (np.abs(z) <= CASCADE_MAX_Z)
+    inside = ((temperatures >= min_temp + CASCADE_BOUNDS_MARGIN)
+              & (temperatures <= max_temp - CASCADE_BOUNDS_MARGIN))
+    clearly_normal = inside & calm & has_history
+    suspicious = has_history & ~calm
+    return clearly_normal, suspicious
+
+
+def _detect(temperatures, rooms=None, use_model=None, st=None):
+    """
+    Runs the cascade and hybrid rules over readings in order and updates `st`.
+
+    `use_model`: None follows CASCADE_ENABLED, True always runs the model,
+    False bypasses it entirely. Bypassed readings still update the persistence
+    history, using the cheap tier's `suspicious` flag in place of the model.
+    """
+    st = state if st is None else st
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    n = len(temperatures)
+    rooms = (np.full(n, DEFAULT_ROOM, dtype=object) if rooms is None
+             else np.asarray([DEFAULT_ROOM if r is None else r for r in rooms], dtype=object))
+
+    # State is read (history, windows) and then updated, so concurrent requests
+    # are serialized to keep each room's readings in order
+    with _state_lock:
+        # --- Tier 1: cheap checks ---
+        min_temp, max_temp = _room_bounds(rooms)
+        clearly_normal, suspicious = _cheap_checks(st, temperatures, rooms, min_temp, max_temp)
+        if use_model is None:
+            escalate = ~clearly_normal if CASCADE_ENABLED else np.ones(n, dtype=bool)
+        else:
+            escalate = np.full(n, bool(use_model))
+
+        # --- Tier 2: model reconstruction of SEQ_LEN windows for escalated readings ---
+        # Rooms still warming up (fewer than SEQ_LEN readings) fall back to the cheap tier
+        errors, thresholds = _score_windows(st, temperatures, rooms, escalate)
+        scored = ~np.isnan(errors)
+        is_anom_raw = np.where(scored, errors > thresholds, suspicious)
+
+        # --- Persistence rule + rolling history, row by row in order ---
+        persistence_alert = np.empty(n, dtype=bool)
+        for i in range(n):
+            persistence_alert[i] = _update_persistence(st, rooms[i], is_anom_raw[i])
+            st.recent_temps[rooms[i]].append(float(temperatures[i]))
+
+        # --- Absolute bounds check + hybrid alert ---
+        bounds_breach = (temperatures < min_temp) | (temperatures > max_temp)
+
+        n_escalated, n_scored = int(escalate.sum()), int(scored.sum())
+        st.stats["readings"] += n
+        st.stats["escalated"] += n_scored
+        st.stats["warming_up"] += n_escalated - n_scored
+        st.stats["short_circuited"] += n - n_escalated
+        if st is state and st.stats["readings"] - _last_checkpoint >= SNAPSHOT_EVERY:
+            checkpoint()
+
+    return {
+        "temperature": temperatures,
+        "reconstruction_error": errors,
+        "raw_anomaly": is_anom_raw,
+        "persistence_alert": persistence_alert,
+        "bounds_breach": bounds_breach,
+        "hybrid_alert": persistence_alert | bounds_breach,
+        "escalated": scored,
+    }
+
+
+def detect_anomaly(data_point: float, room: str = DEFAULT_ROOM, use_model=None):
     """
     Runs hybrid anomaly detection on a single temperature reading.
 
     Steps:
-    1. Scale input using the same scaler from training.
-    2. Use the LSTM model to reconstruct the reading.
-    3. Compute reconstruction error (difference between actual and predicted).
-    4. Compare error to a statistical threshold.
+    1. Run cheap checks (bounds margin, delta from last reading, rolling z-score).
+       Clearly normal readings skip steps 2-4.
+    2. Scale the room's last SEQ_LEN readings with the scaler from training.
+    3. Use the room's LSTM model (or the shared one) to reconstruct the window.
+    4. Compare the mean reconstruction error to the calibrated threshold.
     5. Apply persistence filter: require N consecutive anomalies.
-    6. Apply absolute temperature bounds.
+    6. Apply the room's absolute temperature bounds.
     7. Combine both (hybrid) to decide whether to raise an alert.
 
     Args:
         data_point (float): Temperature reading in °C.
+        room (str): Room the reading belongs to; state is tracked per room.
+        use_model (bool, optional): Force (True) or bypass (False) the model;
+            None lets the cascade decide.
+
+    Returns:
+        dict: Detection results including reconstruction error (None when the
+              model was skipped), raw anomaly flag, persistence alert, bounds
+              breach, final hybrid decision and whether the model ran.
+    """
+    result = _detect([data_point], [room], use_model)
+    error = float(result["reconstruction_error"][0])
+
+    return {
+        "temperature": data_point,
+        "reconstruction_error": None if np.isnan(error) else error,
+        "raw_anomaly": bool(result["raw_anomaly"][0]),
+        "persistence_alert": bool(result["persistence_alert"][0]),
+        "bounds_breach": bool(result["bounds_breach"][0]),
+        "hybrid_alert": bool(result["hybrid_alert"][0]),
+        "escalated": bool(result["escalated"][0]),
+    }
+
+
+def detect_anomaly_batch(temperatures, rooms=None, use_model=None):
+    """
+    Vectorized version of detect_anomaly for a batch of readings.
+
+    Cheap checks run over the whole batch and the model runs once for the
+    escalated rows; only the persistence rule is applied row by row, in order,
+    so each room's readings must be chronological.
+
+    Args:
+        temperatures (array-like): Temperature readings in °C.
+        rooms (array-like, optional): Room per reading (defaults to DEFAULT_ROOM).
+        use_model (bool, optional): See detect_anomaly.
 
     Returns:
-        dict: Detection results including reconstruction error, raw anomaly flag,
-              persistence alert, bounds breach, and final hybrid decision.
+        dict: Column arrays with the same keys as detect_anomaly
+              (reconstruction_error is NaN where the model was skipped).
     """
+    return _detect(temperatures, rooms, use_model)
+
 
-    # --- Preprocessing ---
-    scaled = scaler.transform(np.array([[data_point]]))
+def get_cascade_stats(st=None):
+    """Returns cascade counters and the fraction of readings that skipped the model."""
+    st = state if st is None else st
+    stats = dict(st.stats)
+    stats["short_circuit_rate"] = (
+        stats["short_circuited"] / stats["readings"] if stats["readings"] else 0.0
+    )
+    return stats
 
-    # --- Model reconstruction ---
-    recon = model.predict(scaled.reshape(1, 1, 1), verbose=0)
-    error = abs(scaled - recon[0][0])
 
-    # --- Basic statistical threshold ---
-    threshold = 0.2  # This can be tuned empirically
+def evaluate_cascade(temperatures, rooms=None):
+    """
+    Offline comparison of the cascade against always running the model.
 
-    # --- Raw anomaly flag ---
-    is_anom_raw = error > threshold
+    Both runs start from fresh state and leave the live detector untouched.
 
-    # --- Persistence rule: track consecutive anomalies ---
-    recent_anomalies.append(bool(is_anom_raw))
-    if len(recent_anomalies) > PERSISTENCE_N:
-        recent_anomalies.pop(0)
+    Returns:
+        dict: Short-circuit rate and how alert decisions differ.
+    """
+    cascade_state, full_state = DetectorState(), DetectorState()
+    cascade = _detect(temperatures, rooms, None, cascade_state)
+    full = _detect(temperatures, rooms, True, full_state)
 
-    persistence_alert = all(recent_anomalies[-PERSISTENCE_N:])
+    alerts_c, alerts_f = cascade["hybrid_alert"], full["hybrid_alert"]
+    summary = get_cascade_stats(cascade_state)
+    summary.update({
+        "alerts_cascade": int(alerts_c.sum()),
+        "alerts_full_model": int(alerts_f.sum()),
+        "alert_agreement": float(np.mean(alerts_c == alerts_f)) if len(alerts_c) else 1.0,
+        "missed_alerts": int((alerts_f & ~alerts_c).sum()),
+        "extra_alerts": int((alerts_c & ~alerts_f).sum()),
+        "raw_anomaly_disagreements": int((cascade["raw_anomaly"] != full["raw_anomaly"]).sum()),
+    })
+    return summary
 
-    # --- Absolute bounds check ---
-    bounds_breach = (data_point < MIN_TEMP) or (data_point > MAX_TEMP)
 
-    # --- Final hybrid alert ---
-    hybrid_alert = bool(persistence_alert or bounds_breach)
+def checkpoint():
+    """Writes the live detector state to SNAPSHOT_PATH."""
+    global _last_checkpoint
+    with _state_lock:
+        save_snapshot(state, SNAPSHOT_PATH, MODEL_DIGEST)
+        _last_checkpoint = state.stats["readings"]
 
+
+def restore_state():
+    """
+    Restores the live detector state on startup.
+
+    Uses the snapshot when it matches the current model and is fresh;
+    otherwise replays each room's latest REPLAY_LIMIT readings from
+    sensor_readings, and DEFAULT_ROOM's from the stream's readings table,
+    skipping anything older than REPLAY_MAX_AGE (counters start from zero
+    in that case).
+
+    Returns:
+        dict: Restore source ("snapshot", "replay" or "empty"), readings replayed
+              and elapsed milliseconds.
+    """
+    global state, _last_checkpoint
+    start = time.perf_counter()
+    restored = load_snapshot(SNAPSHOT_PATH, MODEL_DIGEST, SNAPSHOT_MAX_AGE)
+    source, replayed = "snapshot", 0
+
+    if restored is None:
+        restored = DetectorState()
+        since = (datetime.now() - timedelta(seconds=REPLAY_MAX_AGE)).strftime("%Y-%m-%d %H:%M:%S")
+        temperatures, rooms = load_history(REPLAY_DB_PATH, REPLAY_LIMIT, since)
+        stream_temps, stream_rooms = load_stream_history(STREAM_DB_PATH, DEFAULT_ROOM,
+                                                         REPLAY_LIMIT, since)
+        temperatures = np.concatenate([temperatures, stream_temps])
+        rooms = rooms + stream_rooms
+        replayed = len(temperatures)
+        source = "replay" if replayed else "empty"
+        if replayed:
+            _detect(temperatures, rooms, None, restored)
+            restored.stats = DetectorState().stats
+
+    with _state_lock:
+        state = restored
+        _last_checkpoint = state.stats["readings"]
     return {
-        "temperature": data_point,
-        "reconstruction_error": float(error),
-        "raw_anomaly": bool(is_anom_raw),
-        "persistence_alert": bool(persistence_alert),
-        "bounds_breach": bool(bounds_breach),
-        "hybrid_alert": hybrid_alert
+        "source": source,
+        "replayed": replayed,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
     }
@@ -0,0 +1,356 @@
+"""
+deployment/payloads.py
+----------------------
+Encoders/decoders for batch scoring payloads used by POST /predict/batch.
+
+Supported content types:
+    application/json                      - columnar JSON (see below)
+    application/vnd.apache.arrow.stream   - Arrow IPC stream (requires pyarrow)
+    application/x-tad-batch               - raw little-endian arrays (documented below)
+
+Columnar JSON request:
+    {"temperature": [-21.3, -20.8], "room": ["Frozen_Storage_A", ...], "timestamp": [1759276800, ...]}
+    "room" and "timestamp" (integer epoch seconds) are optional.
+
+Arrow request: one record batch stream with columns
+    temperature (float32/float64), room (string or dictionary<string>, optional),
+    timestamp (int64 epoch seconds or any timestamp unit, truncated to seconds; optional).
+    Null values are rejected.
+
+Raw request layout (little-endian, offsets in bytes):
+    0      4        magic b"TADB"
+    4      4        uint32  n_rows
+    8      4        uint32  room_table_len (bytes)
+    12     ...      UTF-8 room names joined by "\\n" (may be empty)
+    ...    0-7      zero padding to the next multiple of 8
+    ...    8 * n    int64   timestamp (epoch seconds)
+    ...    4 * n    float32 temperature
+    ...    2 * n    uint16  index into the room table (omitted if the table is empty)
+
+Raw response layout:
+    0      4        magic b"TADR"
+    4      4        uint32  n_rows
+    8      4 * n    float32 reconstruction_error
+    ...    1 * n    uint8   flags: bit0 raw_anomaly, bit1 persistence_alert,
+                            bit2 bounds_breach, bit3 hybrid_alert,
+                            bit4 escalated (model ran; error is NaN otherwise)
+
+Rows are scored in the order given, so each room's rows must be chronological.
+Decoding returns NumPy views over the request body wherever the layout allows.
+"""
+
+import json
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow payloads are optional
+    pa = None
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library serializer
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+RAW_MEDIA_TYPE = "application/x-tad-batch"
+
+RAW_REQUEST_MAGIC = b"TADB"
+RAW_RESPONSE_MAGIC = b"TADR"
+_HEADER = struct.Struct("<4sII")
+_RESPONSE_HEADER = struct.Struct("<4sI")
+_RESULT_FLAGS = (
+    "raw_anomaly", "persistence_alert", "bounds_breach", "hybrid_alert", "escalated",
+)
+
+
+class PayloadError(ValueError):
+    """Raised when a batch payload cannot be decoded."""
+
+
+@dataclass
+class Batch:
+    """Decoded batch of readings as NumPy columns."""
+    temperature: np.ndarray                 # float32, shape (n,)
+    room_codes: Optional[np.ndarray] = None  # integer codes into room_names
+    room_names: Optional[list] = None
+    timestamp: Optional[np.ndarray] = None  # int64 epoch seconds
+
+    def __len__(self):
+        return len(self.temperature)
+
+    def rooms(self):
+        """Room name per row, or None if the batch carries no rooms."""
+        if self.room_codes is None:
+            return None
+        return np.asarray(self.room_names, dtype=object)[self.room_codes]
+
+
+# === JSON ===
+def json_loads(body):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def json_dumps(obj):
+    """Serializes to bytes; numeric NumPy arrays are handled natively when orjson is available."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_to_builtin, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_to_builtin).encode()
+
+
+def _to_builtin(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_json(body):
+    try:
+        data = json_loads(body)
+        batch = Batch(temperature=np.asarray(data["temperature"], dtype=np.float32))
+        if data.get("room") is not None:
+            rooms = data["room"]
+            if not isinstance(rooms, list) or not all(isinstance(r, str) for r in rooms):
+                raise PayloadError("Column 'room' must be a list of strings without nulls.")
+            names, codes = np.unique(np.asarray(rooms, dtype=str), return_inverse=True)
+            batch.room_names, batch.room_codes = names.tolist(), codes
+        if data.get("timestamp") is not None:
+            timestamps = data["timestamp"]
+            # Checked per value: an int64 cast would silently truncate 1.5 to 1
+            if not isinstance(timestamps, list) or not all(
+                isinstance(t, int) and not isinstance(t, bool) for t in timestamps
+            ):
+                raise PayloadError("Column 'timestamp' must be a list of integer epoch seconds.")
+            batch.timestamp = np.asarray(timestamps, dtype=np.int64)
+    except PayloadError:
+        raise
+    except (KeyError, TypeError, ValueError, AttributeError, OverflowError) as e:
+        # orjson.JSONDecodeError is a ValueError; OverflowError covers ints beyond int64
+        raise PayloadError(f"Invalid JSON batch: {e}") from e
+    _validate(batch)
+    return batch
+
+
+def encode_json(results):
+    return json_dumps(results)
+
+
+# === RAW ===
+def encode_raw_request(temperature, rooms=None, timestamp=None):
+    """Builds a raw request payload (used by clients, tests and benchmarks)."""
+    temperature = np.asarray(temperature, dtype="<f4")
+    n = len(temperature)
+    timestamp = (np.zeros(n, dtype="<i8") if timestamp is None
+                 else np.asarray(timestamp, dtype="<i8"))
+    room_table, codes = b"", None
+    if rooms is not None:
+        names, codes = np.unique(np.asarray(rooms, dtype=str), return_inverse=True)
+        if len(names) > np.iinfo("<u2").max + 1:
+            raise PayloadError(f"Raw batches hold at most 65536 rooms, got {len(names)}.")
+        if any("\n" in name for name in names):
+            raise PayloadError("Room names in raw batches cannot contain newlines.")
+        room_table = "\n".join(names).encode("utf-8")
+        codes = codes.astype("<u2")
+    header = _HEADER.pack(RAW_REQUEST_MAGIC, n, len(room_table)) + room_table
+    parts = [header, b"\0" * (-len(header) % 8), timestamp.tobytes(), temperature.tobytes()]
+    if codes is not None:
+        parts.append(codes.tobytes())
+    return b"".join(parts)
+
+
+def decode_raw(body):
+    if len(body) < _HEADER.size:
+        raise PayloadError("Raw batch shorter than its header.")
+    magic, n, table_len = _HEADER.unpack_from(body)
+    if magic != RAW_REQUEST_MAGIC:
+        raise PayloadError(f"Bad raw batch magic: {magic!r}")
+    offset = _HEADER.size + table_len
+    try:
+        room_names = body[_HEADER.size:offset].decode("utf-8").split("\n") if table_len else None
+    except UnicodeDecodeError as e:
+        raise PayloadError(f"Raw batch room table is not valid UTF-8: {e}") from e
+    offset += -offset % 8
+
+    expected = offset + n * (8 + 4 + (2 if room_names else 0))
+    if len(body) != expected:
+        raise PayloadError(f"Raw batch is {len(body)} bytes, expected {expected}.")
+
+    timestamp = np.frombuffer(body, dtype="<i8", count=n, offset=offset)
+    offset += 8 * n
+    temperature = np.frombuffer(body, dtype="<f4", count=n, offset=offset)
+    offset += 4 * n
+    batch = Batch(temperature=temperature, timestamp=timestamp)
+    if room_names:
+        codes = np.frombuffer(body, dtype="<u2", count=n, offset=offset)
+        if n and codes.max() >= len(room_names):
+            raise PayloadError("Raw batch room index out of range.")
+        batch.room_names, batch.room_codes = room_names, codes
+    _validate(batch)
+    return batch
+
+
+def encode_raw(results):
+    n = len(results["reconstruction_error"])
+    flags = np.zeros(n, dtype=np.uint8)
+    for bit, name in enumerate(_RESULT_FLAGS):
+        flags |= np.asarray(results[name], dtype=np.uint8) << bit
+    return b"".join([
+        _RESPONSE_HEADER.pack(RAW_RESPONSE_MAGIC, n),
+        np.asarray(results["reconstruction_error"], dtype="<f4").tobytes(),
+        flags.tobytes(),
+    ])
+
+
+def decode_raw_response(body):
+    """Inverse of encode_raw, for clients and benchmarks."""
+    magic, n = _RESPONSE_HEADER.unpack_from(body)
+    if magic != RAW_RESPONSE_MAGIC:
+        raise PayloadError(f"Bad raw response magic: {magic!r}")
+    offset = _RESPONSE_HEADER.size
+    errors = np.frombuffer(body, dtype="<f4", count=n, offset=offset)
+    flags = np.frombuffer(body, dtype=np.uint8, count=n, offset=offset + 4 * n)
+    results = {"reconstruction_error": errors}
+    for bit, name in enumerate(_RESULT_FLAGS):
+        results[name] = (flags >> bit) & 1 == 1
+    return results
+
+
+# === ARROW ===
+def _require_arrow():
+    if pa is None:
+        raise PayloadError("Arrow payloads require pyarrow to be installed.")
+
+
+def decode_arrow(body):
+    _require_arrow()
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+        # combine_chunks() also yields an (empty) array for a stream without batches
+        temperature = table.column("temperature").combine_chunks()
+        if temperature.null_count:
+            raise PayloadError("Column 'temperature' contains nulls.")
+        if temperature.type != pa.float32():
+            temperature = temperature.cast(pa.float32())
+        batch = Batch(temperature=temperature.to_numpy(zero_copy_only=False))
+
+        names = table.column_names
+        if "room" in names:
+            room = table.column("room").combine_chunks()
+            if room.null_count:
+                raise PayloadError("Column 'room' contains nulls.")
+            if not pa.types.is_dictionary(room.type):
+                room = room.dictionary_encode()
+            batch.room_names = [str(name) for name in room.dictionary.to_pylist()]
+            batch.room_codes = room.indices.to_numpy(zero_copy_only=False)
+        if "timestamp" in names:
+            ts = table.column("timestamp").combine_chunks()
+            if ts.null_count:
+                raise PayloadError("Column 'timestamp' contains nulls.")
+            if pa.types.is_timestamp(ts.type):
+                # Sub-second precision is truncated to whole seconds
+                ts = ts.cast(pa.timestamp("s"), safe=False).cast(pa.int64())
+            batch.timestamp = ts.to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+    except PayloadError:
+        raise
+    except (pa.ArrowException, KeyError, IndexError, TypeError, ValueError) as e:
+        raise PayloadError(f"Invalid Arrow batch: {e}") from e
+    _validate(batch)
+    return batch
+
+
+def encode_arrow(results):
+    _require_arrow()
+    table = pa.table({
+        name: values if isinstance(values, pa.Array) else np.asarray(values)
+        for name, values in results.items()
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_arrow_request(temperature, rooms=None, timestamp=None):
+    """Builds an Arrow request payload (used by clients, tests and benchmarks)."""
+    columns = {"temperature": np.asarray(temperature, dtype=np.float32)}
+    if rooms is not None:
+        columns["room"] = pa.array(rooms, type=pa.string()).dictionary_encode()
+    if timestamp is not None:
+        columns["timestamp"] = np.asarray(timestamp, dtype=np.int64)
+    return encode_arrow(columns)
+
+
+# === DISPATCH ===
+DECODERS = {
+    JSON_MEDIA_TYPE: decode_json,
+    ARROW_MEDIA_TYPE: decode_arrow,
+    RAW_MEDIA_TYPE: decode_raw,
+}
+ENCODERS = {
+    JSON_MEDIA_TYPE: encode_json,
+    ARROW_MEDIA_TYPE: encode_arrow,
+    RAW_MEDIA_TYPE: encode_raw,
+}
+
+
+def media_type(header, default=JSON_MEDIA_TYPE):
+    """Strips parameters (e.g. charset) from a Content-Type header value."""
+    if not header:
+        return default
+    return header.split(";")[0].strip().lower()
+
+
+def accept_media_type(header, default=JSON_MEDIA_TYPE):
+    """
+    Picks the response type from an Accept header.
+
+    Entries are ranked by their q value (ties keep header order) and the first
+    one with an encoder wins; wildcards resolve to `default`.
+
+    Returns:
+        str, or None if no acceptable type is supported.
+    """
+    if not header:
+        return default
+    ranked = []
+    for position, entry in enumerate(header.split(",")):
+        media, *params = [part.strip() for part in entry.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media and q > 0:
+            ranked.append((-q, position, media.lower()))
+
+    for _, _, media in sorted(ranked):
+        if media in ENCODERS:
+            return media
+        if media in ("*/*", "application/*"):
+            return default
+    return None
+
+
+def _validate(batch):
+    """Checks column shapes and values shared by every decoder."""
+    if batch.temperature.ndim != 1:
+        raise PayloadError("Column 'temperature' must be a flat list of numbers.")
+    if not np.isfinite(batch.temperature).all():
+        raise PayloadError("Column 'temperature' contains null, NaN or infinite values.")
+    if batch.timestamp is not None and batch.timestamp.ndim != 1:
+        raise PayloadError("Column 'timestamp' must be a flat list of integers.")
+    n = len(batch.temperature)
+    for name in ("room_codes", "timestamp"):
+        column = getattr(batch, name)
+        if column is not None and len(column) != n:
+            raise PayloadError(f"Column '{name}' has {len(column)} rows, expected {n}.")
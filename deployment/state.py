@@ -0,0 +1,211 @@
+"""
+deployment/state.py
+-------------------
+Streaming detector state and its binary snapshot format.
+
+The snapshot lets the API restart warm: it is written periodically and on
+shutdown, memory-mapped on startup and rejected when it was produced for a
+different model (digest mismatch), by another format version, or is too old.
+
+Snapshot layout (little-endian, offsets in bytes):
+    0      4        magic b"TADS"
+    4      4        uint32  format version
+    8      32       SHA-256 digest of the model artifacts
+    40     8        float64 created_at (epoch seconds)
+    48     4        uint32  header_len
+    52     ...      UTF-8 JSON header: rooms, per-room lengths, counters
+    ...    0-7      zero padding to the next multiple of 8
+    ...    8 * T    float64 recent temperatures, all rooms concatenated
+    ...    1 * A    uint8   recent raw anomaly flags, all rooms concatenated
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from deployment.config import CASCADE_WINDOW, PERSISTENCE_N, SEQ_LEN
+
+SNAPSHOT_MAGIC = b"TADS"
+SNAPSHOT_VERSION = 2
+# Temperatures kept per room: enough for the cascade's rolling stats and
+# for the model's SEQ_LEN input window
+HISTORY_LEN = max(CASCADE_WINDOW, SEQ_LEN)
+_HEADER = struct.Struct("<4sI32sdI")
+
+
+class DetectorState:
+    """Streaming state of the detector, tracked per room."""
+
+    def __init__(self):
+        # Recent raw anomaly flags for the persistence rule
+        self.recent_anomalies = defaultdict(list)
+        # Recent temperatures for the cascade's rolling stats and model windows
+        self.recent_temps = defaultdict(lambda: deque(maxlen=HISTORY_LEN))
+        # Cascade counters
+        self.stats = {"readings": 0, "short_circuited": 0, "escalated": 0, "warming_up": 0}
+
+
+def artifacts_digest(*paths):
+    """SHA-256 over the given files (e.g. model + scaler), used to version snapshots."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.digest()
+
+
+def save_snapshot(st, path, model_digest):
+    """Writes `st` to `path` atomically (temp file + rename)."""
+    rooms = sorted(set(st.recent_temps) | set(st.recent_anomalies))
+    temps = [list(st.recent_temps.get(room, ())) for room in rooms]
+    flags = [st.recent_anomalies.get(room, [])[-PERSISTENCE_N:] for room in rooms]
+    header = json.dumps({
+        "rooms": rooms,
+        "temps_len": [len(t) for t in temps],
+        "flags_len": [len(f) for f in flags],
+        "stats": st.stats,
+    }).encode("utf-8")
+
+    prefix = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, model_digest, time.time(), len(header))
+    prefix += header
+    parts = [
+        prefix,
+        b"\0" * (-len(prefix) % 8),
+        np.asarray([v for t in temps for v in t], dtype="<f8").tobytes(),
+        np.asarray([f for fl in flags for f in fl], dtype=np.uint8).tobytes(),
+    ]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path, model_digest, max_age=None):
+    """
+    Restores a DetectorState from `path` via a read-only memory map.
+
+    Returns:
+        DetectorState, or None if the snapshot is missing, corrupt, from another
+        model or format version, or older than `max_age` seconds.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < _HEADER.size:
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, version, digest, created_at, header_len = _HEADER.unpack_from(mm)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or digest != model_digest:
+            return None
+        if max_age is not None and time.time() - created_at > max_age:
+            return None
+        # A header that parses but has the wrong shape is treated like a corrupt file
+        try:
+            header = json.loads(mm[_HEADER.size:_HEADER.size + header_len])
+            rooms, temps_len, flags_len = header["rooms"], header["temps_len"], header["flags_len"]
+            stats = header["stats"]
+            if not all(isinstance(v, list) for v in (rooms, temps_len, flags_len)):
+                raise TypeError("rooms, temps_len and flags_len must be lists")
+            if not len(rooms) == len(temps_len) == len(flags_len):
+                raise ValueError("per-room lists differ in length")
+            if not all(isinstance(room, str) for room in rooms):
+                raise TypeError("room names must be strings")
+            if any(not isinstance(v, int) or v < 0 for v in temps_len + flags_len):
+                raise ValueError("per-room lengths must be non-negative integers")
+            if not all(isinstance(v, int) for v in stats.values()):
+                raise TypeError("counters must be integers")
+            offset = _HEADER.size + header_len
+            offset += -offset % 8
+            n_temps, n_flags = sum(temps_len), sum(flags_len)
+            temps = np.frombuffer(mm, dtype="<f8", count=n_temps, offset=offset).tolist()
+            flags = np.frombuffer(mm, dtype=np.uint8, count=n_flags,
+                                  offset=offset + 8 * n_temps).tolist()
+
+            st = DetectorState()
+            st.stats.update(stats)
+            t_pos = f_pos = 0
+            for room, t_len, f_len in zip(rooms, temps_len, flags_len):
+                st.recent_temps[room].extend(temps[t_pos:t_pos + t_len])
+                st.recent_anomalies[room] = [bool(v) for v in flags[f_pos:f_pos + f_len]]
+                t_pos += t_len
+                f_pos += f_len
+        except (ValueError, KeyError, TypeError):
+            return None
+    return st
+
+
+def load_history(db_path, limit, since):
+    """
+    Reads the latest `limit` readings of every room from `sensor_readings`,
+    skipping readings older than `since` ("YYYY-MM-DD HH:MM:SS").
+
+    Each room is read with an indexed (room_name, timestamp) range query, so
+    the cost is bounded by rooms × limit regardless of the table size.
+
+    Returns:
+        (temperatures, rooms): chronological within each room.
+    """
+    if not os.path.exists(db_path):
+        return np.empty(0), []
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = _tables(conn)
+        if "sensor_readings" not in tables:
+            return np.empty(0), []
+        if "rooms" in tables:
+            room_names = [row[0] for row in conn.execute("SELECT room_name FROM rooms")]
+        else:
+            room_names = [row[0] for row in conn.execute("SELECT DISTINCT room_name FROM sensor_readings")]
+
+        temperatures, rooms = [], []
+        for room in room_names:
+            rows = conn.execute("""
+                SELECT temperature FROM sensor_readings
+                WHERE room_name = ? AND timestamp >= ? AND temperature IS NOT NULL
+                ORDER BY timestamp DESC, reading_id DESC
+                LIMIT ?
+            """, (room, since, limit)).fetchall()
+            temperatures.extend(row[0] for row in reversed(rows))
+            rooms.extend([room] * len(rows))
+    finally:
+        conn.close()
+    return np.asarray(temperatures, dtype=np.float64), rooms
+
+
+def load_stream_history(db_path, room, limit, since):
+    """
+    Reads the latest `limit` readings logged by deployment/simulate_stream.py.
+
+    Its `readings` table has no room column (the stream posts to /predict
+    without one), so every row is assigned to `room`.
+
+    Returns:
+        (temperatures, rooms): chronological.
+    """
+    if not os.path.exists(db_path):
+        return np.empty(0), []
+    conn = sqlite3.connect(db_path)
+    try:
+        if "readings" not in _tables(conn):
+            return np.empty(0), []
+        rows = conn.execute("""
+            SELECT temperature FROM readings
+            WHERE timestamp >= ? AND temperature IS NOT NULL
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        """, (since, limit)).fetchall()
+    finally:
+        conn.close()
+    temperatures = np.asarray([row[0] for row in reversed(rows)], dtype=np.float64)
+    return temperatures, [room] * len(rows)
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
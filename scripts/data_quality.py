@@ -0,0 +1,256 @@
+"""
+data_quality.py
+---------------
+
+Incremental data-quality checks for sensor_readings.
+
+A watermark is kept per room in dq_watermarks: the latest checked
+timestamp, its temperature and the length of the run of identical
+temperatures ending there. Each run only inspects readings newer than the
+watermark, using indexed range queries on (room_name, timestamp) and SQL
+window functions, and carries the watermark state into them so results
+match a full re-check.
+
+Checks per new reading:
+    1. GAP            - time since previous reading exceeds the expected cadence.
+    2. DUPLICATE      - same timestamp as the previous reading.
+    3. FLATLINE       - temperature unchanged for FLATLINE_N consecutive readings
+                        (missing temperatures break a run).
+    4. HUMIDITY_RANGE - humidity outside the room's min/max_humidity.
+
+Tables affected:
+    - dq_watermarks  (per-room watermark, created if missing)
+    - dq_results     (one row per detected issue, created if missing)
+    - system_logs    (run summary)
+
+Note: readings arriving late with a timestamp at or before a room's
+watermark are not re-checked.
+
+Usage:
+    python scripts/data_quality.py
+    python scripts/data_quality.py --full   # reset watermarks and re-check everything
+"""
+
+import argparse
+import sqlite3
+import time
+
+# Step 1: Define database path and check parameters
+DB_PATH = "database/cold_storage.db"
+CADENCE_SECONDS = 15 * 60   # readings are expected every 15 minutes
+GAP_TOLERANCE = 1.5         # a gap is flagged when delta > cadence * tolerance
+FLATLINE_N = 4              # identical consecutive temperatures = stuck sensor (1 hour)
+
+SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_room_ts
+    ON sensor_readings (room_name, timestamp);
+
+CREATE TABLE IF NOT EXISTS dq_watermarks (
+    room_name TEXT PRIMARY KEY,
+    last_timestamp DATETIME NOT NULL,
+    last_temperature REAL,
+    run_len INTEGER NOT NULL DEFAULT 0,  -- identical temperatures ending at last_timestamp
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (room_name) REFERENCES rooms (room_name)
+);
+
+CREATE TABLE IF NOT EXISTS dq_results (
+    result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    checked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    room_name TEXT NOT NULL,
+    timestamp DATETIME NOT NULL,
+    check_type TEXT NOT NULL,  -- 'GAP', 'DUPLICATE', 'FLATLINE', 'HUMIDITY_RANGE'
+    detail TEXT,
+    FOREIGN KEY (room_name) REFERENCES rooms (room_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_dq_results_room_ts
+    ON dq_results (room_name, timestamp);
+"""
+
+# Scores every reading newer than :watermark. LAG defaults and :carry_run_len
+# continue the previous run's last reading and flatline run across the boundary.
+SCORED_CTE = """
+WITH new AS (
+    SELECT reading_id, timestamp, temperature, humidity
+    FROM sensor_readings
+    WHERE room_name = :room AND timestamp > :watermark
+),
+lagged AS (
+    SELECT reading_id, timestamp, temperature, humidity,
+           LAG(timestamp, 1, :watermark) OVER w AS prev_ts,
+           -- Missing temperatures break runs instead of forming a flatline
+           CASE WHEN temperature IS NOT NULL
+                 AND temperature = LAG(temperature, 1, :last_temperature) OVER w
+                THEN 0 ELSE 1 END AS changed
+    FROM new
+    WINDOW w AS (ORDER BY timestamp, reading_id)
+),
+runs AS (
+    SELECT *, SUM(changed) OVER (ORDER BY timestamp, reading_id
+                                 ROWS UNBOUNDED PRECEDING) AS run_id
+    FROM lagged
+),
+scored AS (
+    SELECT *,
+           COUNT(*) OVER (PARTITION BY run_id ORDER BY timestamp, reading_id
+                          ROWS UNBOUNDED PRECEDING)
+               + CASE WHEN run_id = 0 THEN :carry_run_len ELSE 0 END AS run_len,
+           (julianday(timestamp) - julianday(NULLIF(prev_ts, ''))) * 86400.0 AS delta_s
+    FROM runs
+)
+"""
+
+ISSUES_QUERY = SCORED_CTE + """
+SELECT timestamp, temperature, humidity, prev_ts, delta_s, run_len
+FROM scored
+WHERE delta_s = 0
+   OR delta_s > :max_delta
+   OR run_len = :flatline_n
+   OR humidity < :min_humidity
+   OR humidity > :max_humidity
+ORDER BY timestamp, reading_id
+"""
+
+# New watermark: the last reading and the run length ending at it
+WATERMARK_QUERY = SCORED_CTE + """
+SELECT timestamp, temperature, run_len
+FROM scored
+ORDER BY timestamp DESC, reading_id DESC
+LIMIT 1
+"""
+
+
+def ensure_schema(conn):
+    """Creates the watermark/results tables and the range-query index."""
+    conn.executescript(SCHEMA)
+    # Watermark tables created before run-length tracking lack these columns
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(dq_watermarks)")}
+    if "last_temperature" not in columns:
+        conn.execute("ALTER TABLE dq_watermarks ADD COLUMN last_temperature REAL")
+    if "run_len" not in columns:
+        conn.execute("ALTER TABLE dq_watermarks ADD COLUMN run_len INTEGER NOT NULL DEFAULT 0")
+
+
+def classify(row, min_humidity, max_humidity):
+    """Turns one flagged row from ISSUES_QUERY into (check_type, detail) tuples."""
+    timestamp, temperature, humidity, prev_ts, delta_s, run_len = row
+    issues = []
+    if delta_s is not None and delta_s == 0:
+        issues.append(("DUPLICATE", f"duplicate of reading at {prev_ts}"))
+    elif delta_s is not None and delta_s > CADENCE_SECONDS * GAP_TOLERANCE:
+        missing = int(round(delta_s / CADENCE_SECONDS)) - 1
+        issues.append(("GAP", f"{missing} missing interval(s) since {prev_ts}"))
+    if run_len == FLATLINE_N:
+        issues.append(("FLATLINE", f"temperature stuck at {temperature} for {FLATLINE_N} readings"))
+    if humidity is not None and min_humidity is not None and humidity < min_humidity:
+        issues.append(("HUMIDITY_RANGE", f"humidity {humidity} < {min_humidity}"))
+    elif humidity is not None and max_humidity is not None and humidity > max_humidity:
+        issues.append(("HUMIDITY_RANGE", f"humidity {humidity} > {max_humidity}"))
+    return issues
+
+
+def check_room(conn, room, min_humidity, max_humidity):
+    """Checks new readings for one room, stores issues and advances its watermark."""
+    row = conn.execute("""
+        SELECT last_timestamp, last_temperature, run_len FROM dq_watermarks
+        WHERE room_name = ?
+    """, (room,)).fetchone()
+    watermark, last_temperature, carry_run_len = row if row else ("", None, 0)
+
+    n_new = conn.execute("""
+        SELECT COUNT(*) FROM sensor_readings
+        WHERE room_name = ? AND timestamp > ?
+    """, (room, watermark)).fetchone()[0]
+    if n_new == 0:
+        return 0, 0
+
+    params = {
+        "room": room,
+        "watermark": watermark,
+        "last_temperature": last_temperature,
+        "carry_run_len": carry_run_len or 0,
+        "max_delta": CADENCE_SECONDS * GAP_TOLERANCE,
+        "flatline_n": FLATLINE_N,
+        "min_humidity": min_humidity if min_humidity is not None else float("-inf"),
+        "max_humidity": max_humidity if max_humidity is not None else float("inf"),
+    }
+    flagged = conn.execute(ISSUES_QUERY, params).fetchall()
+
+    results = [
+        (room, r[0], check_type, detail)
+        for r in flagged
+        for check_type, detail in classify(r, min_humidity, max_humidity)
+    ]
+    conn.executemany("""
+        INSERT INTO dq_results (room_name, timestamp, check_type, detail)
+        VALUES (?, ?, ?, ?)
+    """, results)
+
+    new_watermark, new_temperature, run_len = conn.execute(WATERMARK_QUERY, params).fetchone()
+    conn.execute("""
+        INSERT INTO dq_watermarks (room_name, last_timestamp, last_temperature, run_len)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (room_name) DO UPDATE
+        SET last_timestamp = excluded.last_timestamp,
+            last_temperature = excluded.last_temperature,
+            run_len = excluded.run_len,
+            updated_at = CURRENT_TIMESTAMP
+    """, (room, new_watermark, new_temperature, run_len))
+    return n_new, len(results)
+
+
+def run_checks(db_path=DB_PATH, full=False):
+    """Runs the incremental checks for every room and logs a summary."""
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_schema(conn)
+        if full:
+            conn.execute("DELETE FROM dq_watermarks")
+            conn.execute("DELETE FROM dq_results")
+            conn.commit()
+
+        start = time.perf_counter()
+        rooms = conn.execute(
+            "SELECT room_name, min_humidity, max_humidity FROM rooms ORDER BY room_name"
+        ).fetchall()
+
+        total_new = total_issues = 0
+        print("\n🔍 Running incremental data-quality checks...\n")
+        for room, min_humidity, max_humidity in rooms:
+            # One transaction per room: results and watermark move together
+            with conn:
+                n_new, n_issues = check_room(conn, room, min_humidity, max_humidity)
+            total_new += n_new
+            total_issues += n_issues
+            print(f"📊 {room}: {n_new:,} new readings, {n_issues:,} issues")
+
+        elapsed = time.perf_counter() - start
+        message = (f"Data-quality check: {total_new:,} new readings, "
+                   f"{total_issues:,} issues in {elapsed:.2f}s.")
+        with conn:
+            conn.execute("""
+                INSERT INTO system_logs (log_level, message, source)
+                VALUES (?, ?, ?)
+            """, ("WARNING" if total_issues else "INFO", message, "data_quality"))
+        print(f"\n✅ {message}")
+
+        if total_issues:
+            summary = conn.execute("""
+                SELECT room_name, check_type, COUNT(*) FROM dq_results
+                GROUP BY room_name, check_type ORDER BY room_name, check_type
+            """).fetchall()
+            print("\n🧾 Issues recorded by room (all runs):")
+            for room, check_type, count in summary:
+                print(f"   {room:<20} {check_type:<15} {count:,}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental sensor data-quality checks.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--full", action="store_true",
+                        help="Reset watermarks and results, then re-check all readings.")
+    args = parser.parse_args()
+    run_checks(args.db, full=args.full)
@@ -51,6 +51,12 @@ CREATE TABLE IF NOT EXISTS sensor_readings (
 );
 """)
 
+# Index for per-room time-range queries (used by data_quality.py)
+cursor.execute("""
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_room_ts
+    ON sensor_readings (room_name, timestamp);
+""")
+
 # Step 6: Create 'anomaly_predictions' table
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS anomaly_predictions (
@@ -0,0 +1,449 @@
+"""
+model_training.py
+-----------------
+Trains LSTM autoencoders for every room in the simulated sensor data and
+writes the artifacts into the layout loaded by deployment/config.py.
+
+Modes:
+    per-room  - one model + scaler per room, trained in parallel worker
+                processes, saved to models/<room_name>/.
+    shared    - a single model + scaler trained on windows from all rooms,
+                saved to models/lstm_model.keras and models/scaler.pkl.
+
+In both modes the calibrated reconstruction-error threshold
+(mean + k·σ, as in notebooks/3_LSTM_anomaly_detection.ipynb) is merged
+into models/thresholds.json.
+
+How it works:
+    1. Scaled temperature series are cached on disk under data/cache/,
+       keyed by the SHA-256 of the source CSV, so retraining on unchanged
+       data skips preprocessing entirely.
+    2. Training windows are zero-copy strided views over the cached series
+       (numpy sliding_window_view), streamed to Keras one batch at a time
+       through tf.data in both modes, so the full window tensor is never built.
+    3. Wall-clock time and process peak RSS are reported per stage; in
+       per-room mode RSS is the worker process's peak. The data preparation
+       and windowing stages also report their peak Python/NumPy heap
+       (tracemalloc), which is left off around TensorFlow so tracing does
+       not skew the training timings.
+
+Usage:
+    python scripts/model_training.py --mode per-room --workers 4
+    python scripts/model_training.py --mode shared --epochs 10
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import MinMaxScaler
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Make the deployment package importable when run as a script
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from deployment.config import (  # noqa: E402
+    MODEL_PATH, SCALER_PATH, THRESHOLDS_PATH, SEQ_LEN, room_model_paths,
+)
+
+# === DEFAULTS ===
+CSV_PATH = os.path.join(ROOT_DIR, "data", "simulated_sensor_data.csv")
+CACHE_DIR = os.path.join(ROOT_DIR, "data", "cache")
+EPOCHS = 30
+BATCH_SIZE = 32
+THRESHOLD_K = 3  # threshold = mean + k * std of reconstruction error
+
+
+# === PROFILING ===
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+@contextmanager
+def stage(name, report, trace_heap=False):
+    """
+    Records wall-clock time and memory of a block into `report`.
+
+    `rss_mb` is the process-wide peak RSS at the end of the stage, which
+    also covers TensorFlow's native memory but never decreases. With
+    `trace_heap`, `heap_mb` is the tracemalloc peak (Python/NumPy allocations
+    only); tracing slows every allocation, so keep it off around TensorFlow.
+    """
+    started_tracing = trace_heap and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if trace_heap:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_heap else None
+        if started_tracing:
+            tracemalloc.stop()
+        report.append({
+            "stage": name,
+            "seconds": elapsed,
+            "heap_mb": None if peak is None else peak / 1e6,
+            "rss_mb": peak_rss_mb(),
+        })
+
+
+def print_report(report):
+    """Prints the collected stage timings as a table."""
+    print("\n⏱️ Stage report:")
+    print(f"{'stage':<45}{'seconds':>10}{'py heap MB':>12}{'peak RSS MB':>13}")
+    for row in report:
+        heap = "n/a" if row["heap_mb"] is None else f"{row['heap_mb']:.1f}"
+        rss = "n/a" if row["rss_mb"] is None else f"{row['rss_mb']:.1f}"
+        print(f"{row['stage']:<45}{row['seconds']:>10.2f}{heap:>12}{rss:>13}")
+
+
+# === DATA PREPARATION ===
+def file_sha256(path, chunk_size=1 << 20):
+    """Hashes a file in chunks so large CSVs are never fully loaded for keying."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_windows(series, seq_len):
+    """
+    Returns all fixed-length windows of `series` as a read-only strided view.
+
+    Shape is [samples, timesteps, 1]; no window data is copied.
+    """
+    windows = sliding_window_view(series, seq_len)
+    return windows[..., np.newaxis]
+
+
+def prepare_series(csv_path, mode, rooms=None):
+    """
+    Loads the CSV and returns ({room: scaled float32 series}, {key: scaler}).
+
+    Per-room mode fits one scaler per room; shared mode fits a single scaler
+    (key "shared") across all selected rooms.
+    """
+    df = pd.read_csv(csv_path, usecols=["timestamp", "room_name", "temperature"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    if rooms:
+        df = df[df["room_name"].isin(rooms)]
+    df = df.sort_values(["room_name", "timestamp"])
+
+    scalers = {}
+    if mode == "shared":
+        scalers["shared"] = MinMaxScaler().fit(df[["temperature"]].to_numpy())
+
+    series = {}
+    for room, room_df in df.groupby("room_name", sort=True):
+        key = "shared" if mode == "shared" else room
+        if key not in scalers:
+            scalers[key] = MinMaxScaler().fit(room_df[["temperature"]].to_numpy())
+        scaled = scalers[key].transform(room_df[["temperature"]].to_numpy())
+        series[room] = np.ascontiguousarray(scaled[:, 0], dtype=np.float32)
+    return series, scalers
+
+
+def load_or_prepare(csv_path, mode, rooms, cache_dir, use_cache=True):
+    """
+    Returns cached scaled series (memory-mapped) if the source data is unchanged,
+    otherwise prepares them and writes the cache.
+    """
+    key = f"{file_sha256(csv_path)[:16]}_{mode}"
+    if rooms:
+        key += "_" + hashlib.sha256(",".join(sorted(rooms)).encode()).hexdigest()[:8]
+    entry_dir = os.path.join(cache_dir, key)
+    index_path = os.path.join(entry_dir, "index.json")
+
+    if use_cache and os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        series = {
+            room: np.load(os.path.join(entry_dir, fname), mmap_mode="r")
+            for room, fname in index["series"].items()
+        }
+        scalers = joblib.load(os.path.join(entry_dir, "scalers.pkl"))
+        print(f"📦 Using cached dataset: {entry_dir}")
+        return series, scalers
+
+    series, scalers = prepare_series(csv_path, mode, rooms)
+    if use_cache:
+        os.makedirs(entry_dir, exist_ok=True)
+        index = {"series": {}}
+        for i, (room, values) in enumerate(series.items()):
+            fname = f"series_{i}.npy"
+            np.save(os.path.join(entry_dir, fname), values)
+            index["series"][room] = fname
+        joblib.dump(scalers, os.path.join(entry_dir, "scalers.pkl"))
+        # index.json is written last so a partial cache entry is never used
+        with open(index_path, "w") as f:
+            json.dump(index, f, indent=2)
+        print(f"💾 Cached dataset: {entry_dir}")
+    return series, scalers
+
+
+# === MODEL ===
+def build_model(seq_len):
+    """Builds the LSTM autoencoder used in the LSTM notebook."""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense, Dropout
+
+    model = Sequential([
+        Input(shape=(seq_len, 1)),
+        LSTM(64, return_sequences=True),
+        Dropout(0.2),
+        LSTM(32, return_sequences=False),
+        Dense(16, activation="relu"),
+        Dense(32, activation="relu"),
+        Dense(seq_len, activation="linear"),
+    ])
+    model.compile(optimizer="adam", loss="mse")
+    return model
+
+
+def reconstruction_errors(model, windows, batch_size, chunk_batches=64):
+    """
+    Mean absolute reconstruction error per window.
+
+    `windows` may be a strided view; it is copied `chunk_batches` batches at a
+    time. deployment/inference.py scores the SEQ_LEN window ending at each
+    reading with the same definition, so calibrated thresholds apply unchanged.
+    """
+    chunk = batch_size * chunk_batches
+    errors = []
+    for start in range(0, len(windows), chunk):
+        x = np.ascontiguousarray(windows[start:start + chunk])
+        pred = model.predict(x, batch_size=batch_size, verbose=0)
+        errors.append(np.mean(np.abs(pred - x[..., 0]), axis=1))
+    return np.concatenate(errors) if errors else np.empty(0, dtype=np.float32)
+
+
+def calibrate_threshold(errors, k):
+    """Dynamic threshold: mean + k·σ of the reconstruction errors."""
+    return float(np.mean(errors) + k * np.std(errors))
+
+
+def train_room(room, series, scaler, params):
+    """
+    Trains, calibrates and saves the model for a single room.
+
+    Runs inside a worker process in per-room mode, so TensorFlow is imported
+    lazily here rather than in the parent.
+    """
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    report = []
+    seq_len = params["seq_len"]
+
+    with stage(f"{room}: windowing", report, trace_heap=True):
+        series = np.asarray(series)
+        windows = make_windows(series, seq_len)
+        dataset, steps = make_dataset({room: series}, seq_len, params["batch_size"])
+
+    with stage(f"{room}: training", report):
+        model = build_model(seq_len)
+        model.fit(
+            dataset,
+            epochs=params["epochs"],
+            steps_per_epoch=steps,
+            callbacks=[EarlyStopping(monitor="loss", patience=5, restore_best_weights=True)],
+            verbose=0,
+        )
+
+    with stage(f"{room}: calibration", report):
+        errors = reconstruction_errors(model, windows, params["batch_size"])
+        threshold = calibrate_threshold(errors, params["k"])
+
+    with stage(f"{room}: saving", report):
+        model_path, scaler_path = room_model_paths(room)
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        model.save(model_path)
+        joblib.dump(scaler, scaler_path)
+
+    return room, threshold, report
+
+
+def iter_batches(series, seq_len, batch_size, shuffle=True, seed=0):
+    """
+    Yields (x, y) batches drawn from the windows of every room.
+
+    Windows never cross room boundaries and only the current batch is
+    materialised, so memory stays flat regardless of the number of rooms.
+    """
+    views = [make_windows(np.asarray(values), seq_len) for values in series.values()]
+    index = np.concatenate([
+        np.stack([np.full(len(v), i), np.arange(len(v))], axis=1)
+        for i, v in enumerate(views)
+    ])
+    rng = np.random.default_rng(seed)
+    while True:
+        order = rng.permutation(len(index)) if shuffle else np.arange(len(index))
+        for start in range(0, len(order), batch_size):
+            batch = index[order[start:start + batch_size]]
+            x = np.stack([views[r][w] for r, w in batch])
+            yield x, x[..., 0]
+
+
+def make_dataset(series, seq_len, batch_size):
+    """
+    Wraps iter_batches in a prefetching tf.data pipeline.
+
+    Returns:
+        (dataset, steps_per_epoch): one epoch covers every window once.
+    """
+    import tensorflow as tf
+
+    n_windows = sum(max(len(v) - seq_len + 1, 0) for v in series.values())
+    dataset = tf.data.Dataset.from_generator(
+        lambda: iter_batches(series, seq_len, batch_size),
+        output_signature=(
+            tf.TensorSpec(shape=(None, seq_len, 1), dtype=tf.float32),
+            tf.TensorSpec(shape=(None, seq_len), dtype=tf.float32),
+        ),
+    ).prefetch(tf.data.AUTOTUNE)
+    return dataset, int(np.ceil(n_windows / batch_size))
+
+
+def train_shared(series, scaler, params, report):
+    """Trains a single model on windows from all rooms and saves it to MODEL_PATH."""
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    seq_len, batch_size = params["seq_len"], params["batch_size"]
+
+    with stage("shared: training", report):
+        dataset, steps = make_dataset(series, seq_len, batch_size)
+        model = build_model(seq_len)
+        model.fit(
+            dataset,
+            epochs=params["epochs"],
+            steps_per_epoch=steps,
+            callbacks=[EarlyStopping(monitor="loss", patience=5, restore_best_weights=True)],
+            verbose=0,
+        )
+
+    with stage("shared: calibration", report):
+        errors = np.concatenate([
+            reconstruction_errors(model, make_windows(np.asarray(v), seq_len), batch_size)
+            for v in series.values()
+        ])
+        threshold = calibrate_threshold(errors, params["k"])
+
+    with stage("shared: saving", report):
+        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+        model.save(MODEL_PATH)
+        joblib.dump(scaler, SCALER_PATH)
+
+    return threshold
+
+
+def save_thresholds(new_thresholds):
+    """Merges calibrated thresholds into THRESHOLDS_PATH."""
+    thresholds = {}
+    if os.path.exists(THRESHOLDS_PATH):
+        with open(THRESHOLDS_PATH) as f:
+            thresholds = json.load(f)
+    thresholds.update(new_thresholds)
+    os.makedirs(os.path.dirname(THRESHOLDS_PATH), exist_ok=True)
+    with open(THRESHOLDS_PATH, "w") as f:
+        json.dump(thresholds, f, indent=2, sort_keys=True)
+
+
+# === CLI ===
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train LSTM anomaly detection models.")
+    parser.add_argument("--data", default=CSV_PATH, help="Sensor readings CSV.")
+    parser.add_argument("--mode", choices=["per-room", "shared"], default="per-room")
+    parser.add_argument("--rooms", nargs="+", help="Subset of rooms to train (default: all).")
+    parser.add_argument("--seq-len", type=int, default=SEQ_LEN,
+                        help="Window length; must match SEQ_LEN in deployment/config.py.")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--k", type=float, default=THRESHOLD_K,
+                        help="Threshold = mean + k * std of reconstruction error.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Parallel worker processes in per-room mode.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and skip the dataset cache.")
+    args = parser.parse_args(argv)
+    # Inference always scores SEQ_LEN windows; a model trained on another
+    # length would fail Keras' input-shape check on every escalated reading
+    if args.seq_len != SEQ_LEN:
+        parser.error(f"--seq-len {args.seq_len} does not match SEQ_LEN = {SEQ_LEN}; "
+                     "change deployment/config.py first")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = {
+        "seq_len": args.seq_len,
+        "epochs": args.epochs,
+        "batch_size": args.batch_size,
+        "k": args.k,
+    }
+    report = []
+    print(f"🧠 Training mode: {args.mode}")
+
+    with stage("prepare dataset", report, trace_heap=True):
+        series, scalers = load_or_prepare(
+            args.data, args.mode, args.rooms, args.cache_dir, use_cache=not args.no_cache
+        )
+    series = {room: values for room, values in series.items() if len(values) >= args.seq_len}
+    if not series:
+        print(f"❌ No room has at least {args.seq_len} readings.")
+        return
+
+    if args.mode == "shared":
+        thresholds = {"shared": train_shared(series, scalers["shared"], params, report)}
+    else:
+        thresholds = {}
+        workers = max(1, min(args.workers, len(series)))
+        with stage(f"per-room training ({workers} workers)", report):
+            if workers == 1:
+                results = [train_room(room, v, scalers[room], params) for room, v in series.items()]
+            else:
+                # spawn: TensorFlow is not fork-safe
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                    futures = [
+                        pool.submit(train_room, room, np.asarray(v), scalers[room], params)
+                        for room, v in series.items()
+                    ]
+                    results = [f.result() for f in futures]
+        for room, threshold, room_report in results:
+            thresholds[room] = threshold
+            report.extend(room_report)
+
+    save_thresholds(thresholds)
+    for key, value in sorted(thresholds.items()):
+        print(f"✅ {key}: threshold = {value:.5f}")
+    print(f"💾 Thresholds saved to: {THRESHOLDS_PATH}")
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()